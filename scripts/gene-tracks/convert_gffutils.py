@@ -5,6 +5,10 @@ GFF3 to BigBed conversion using gffutils for robust GFF3 parsing.
 This script handles diverse GFF3 formats from Ensembl, NCBI, and other sources.
 It produces separate tracks for genes and transcripts where applicable.
 
+GFF3s with each gene's rows grouped together (Ensembl, GENCODE) are converted
+in a single streaming pass; anything else goes through a gffutils database.
+The streaming pass uses the native gff3-to-bed12 parser when it has been built.
+
 Output format:
   - {genome}.genes.bb: Gene-level features (simple blocks)
   - {genome}.transcripts.bb: Transcript-level features (compound blocks with exons)
@@ -17,16 +21,30 @@ Prerequisites:
 Usage:
     python convert_gffutils.py genome_id
     python convert_gffutils.py --all
+    python convert_gffutils.py --all --jobs 4
     python convert_gffutils.py --list
 """
 
 import argparse
 import gzip
+import hashlib
+import io
 import json
+import os
+import platform
+import shutil
 import subprocess
 import sys
+import tempfile
 import urllib.request
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
+from typing import NamedTuple, Optional, TextIO
+from urllib.parse import unquote
 
 try:
     import gffutils
@@ -40,6 +58,32 @@ CONFIG_FILE = SCRIPT_DIR / "genomes.json"
 OUTPUT_DIR = SCRIPT_DIR / "output"
 TOOLS_DIR = SCRIPT_DIR / "tools"
 TEMP_DIR = SCRIPT_DIR / "temp"
+CACHE_DIR = SCRIPT_DIR / "cache"
+
+# Optional native build of extract_features_stream (see gff3-to-bed12/);
+# used when present, otherwise the Python parser runs. tests/ checks that
+# both match the gffutils path.
+ACCELERATOR = SCRIPT_DIR / "gff3-to-bed12" / "target" / "release" / "gff3-to-bed12"
+ACCELERATOR_FALLBACK = 3  # exit status: layout needs gffutils
+
+# SQLite tuning for the gffutils database. The database is a disposable cache
+# that can always be rebuilt from the GFF3, so durability is traded for speed.
+DB_PRAGMAS = {
+    'journal_mode': 'OFF',
+    'synchronous': 'OFF',
+    'main.cache_size': -262144,  # negative = KiB, i.e. 256 MB
+    'main.page_size': 65536,
+    'temp_store': 'MEMORY',
+}
+
+# BED12 templates. Only the per-feature fields are formatted; score, itemRgb
+# and (for single-block features) the block layout are constant.
+SINGLE_BLOCK_BED12 = "%s\t%d\t%d\t%s\t0\t%s\t%d\t%d\t0,0,0\t1\t%d,\t0,"
+MULTI_BLOCK_BED12 = "%s\t%d\t%d\t%s\t%s\t%s\t%d\t%d\t0,0,0\t%d\t%s\t%s"
+
+# Buffer size for BED12 writers, so millions of short lines reach the OS in
+# large writes instead of the default 8 KB ones
+WRITE_BUFFER_SIZE = 1024 * 1024
 
 
 def load_config():
@@ -48,11 +92,32 @@ def load_config():
         return json.load(f)
 
 
+def read_json_record(path: Path) -> Optional[dict]:
+    """Load a JSON object written by write_json_record, or None if missing or unreadable."""
+    try:
+        with open(path) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def write_json_record(path: Path, record: dict):
+    """Write a JSON object to a temporary name, then rename it into place.
+
+    An interrupted run therefore never leaves a truncated file behind.
+    """
+    partial_path = path.with_name(path.name + ".partial")
+    with open(partial_path, 'w') as f:
+        json.dump(record, f, indent=2)
+    partial_path.replace(path)
+
+
+@lru_cache(maxsize=1)
 def ensure_tools():
-    """Ensure UCSC bedToBigBed tool is available."""
+    """Ensure UCSC bedToBigBed tool is available (resolved once per process)."""
     TOOLS_DIR.mkdir(exist_ok=True)
 
-    import platform
     system = platform.system()
     machine = platform.machine()
 
@@ -70,12 +135,58 @@ def ensure_tools():
     if not tool_path.exists():
         url = f"https://hgdownload.soe.ucsc.edu/admin/exe/{platform_str}/bedToBigBed"
         print(f"  Downloading bedToBigBed from {url}")
-        urllib.request.urlretrieve(url, tool_path)
-        tool_path.chmod(0o755)
+        partial_path = tool_path.with_name(tool_path.name + ".partial")
+        urllib.request.urlretrieve(url, partial_path)
+        partial_path.chmod(0o755)
+        partial_path.replace(tool_path)
 
     return tool_path
 
 
+def remote_validators(url: str) -> dict:
+    """Ask the server for the ETag/Last-Modified of url (empty if unavailable)."""
+    try:
+        request = urllib.request.Request(url, method='HEAD')
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+    except (OSError, ValueError):
+        return {}
+
+
+def fetch_gff3(genome_id: str, url: str) -> Path:
+    """Download a genome's GFF3 into CACHE_DIR, reusing the cached copy if current.
+
+    Each cached file has a JSON manifest next to it recording the URL and the
+    server's ETag/Last-Modified at download time; the file is fetched again
+    only when those change. Gzipped files are cached (and read) compressed.
+    """
+    CACHE_DIR.mkdir(exist_ok=True)
+    suffix = ".gff3.gz" if url.endswith('.gz') else ".gff3"
+    gff3_path = CACHE_DIR / f"{genome_id}{suffix}"
+    manifest_path = gff3_path.with_name(gff3_path.name + ".json")
+
+    validators = remote_validators(url)
+    # A missing or unreadable manifest just means the file is fetched again
+    manifest = read_json_record(manifest_path) if gff3_path.exists() else None
+    # If the server can't be asked (offline, no HEAD support), trust the cache
+    if (manifest and manifest.get('url') == url
+            and all(manifest.get(k) == v for k, v in validators.items())):
+        print(f"  Using cached GFF3: {gff3_path}")
+        return gff3_path
+
+    print(f"  Downloading GFF3...")
+    partial_path = gff3_path.with_name(gff3_path.name + ".partial")
+    urllib.request.urlretrieve(url, partial_path)
+    partial_path.replace(gff3_path)
+
+    write_json_record(manifest_path, {'url': url, **validators})
+
+    return gff3_path
+
+
 def format_label(feature, is_gene: bool = True) -> str:
     """
     Format label as: LOCUS_ID (SYMBOL) or just LOCUS_ID
@@ -83,60 +194,46 @@ def format_label(feature, is_gene: bool = True) -> str:
     For genes: use gene_id/locus_tag as primary, Name/gene as symbol
     For transcripts: use transcript_id as primary, Name as symbol
     """
-    locus_id = None
-    symbol = None
+    get = feature.attributes.get
 
-    if is_gene:
-        # Primary: gene_id, locus_tag, or extract from ID
-        for attr in ['gene_id', 'locus_tag']:
-            if attr in feature.attributes:
-                val = feature.attributes[attr][0]
-                if val and val != '.':
-                    locus_id = val
-                    break
-
-        # Extract from ID if not found (e.g., "gene:AT1G01010" -> "AT1G01010")
-        if not locus_id and 'ID' in feature.attributes:
-            raw_id = feature.attributes['ID'][0]
-            if ':' in raw_id:
-                locus_id = raw_id.split(':')[-1]
-            else:
-                locus_id = raw_id
+    def first(attr):
+        """First value of attr, or None if missing or a '.' placeholder.
 
-        if not locus_id:
-            locus_id = feature.id.split(':')[-1] if feature.id and ':' in feature.id else feature.id
+        Raises IndexError if attr is present with no value (e.g. "Name="),
+        which callers treat as an unusable feature and skip.
+        """
+        values = get(attr)
+        if values is None:
+            return None
+        val = values[0]
+        return val if val and val != '.' else None
 
+    if is_gene:
+        # Primary: gene_id or locus_tag
+        locus_id = first('gene_id') or first('locus_tag')
         # Symbol: Name or gene attribute
-        for attr in ['Name', 'gene', 'gene_name']:
-            if attr in feature.attributes:
-                val = feature.attributes[attr][0]
-                if val and val != '.' and val != locus_id:
-                    symbol = val
-                    break
+        symbol_attrs = ('Name', 'gene', 'gene_name')
     else:
         # Transcript: use transcript_id as primary
-        for attr in ['transcript_id']:
-            if attr in feature.attributes:
-                val = feature.attributes[attr][0]
-                if val and val != '.':
-                    locus_id = val
-                    break
+        locus_id = first('transcript_id')
+        # Symbol for transcript (usually Name like "NAC001-201")
+        symbol_attrs = ('Name',)
 
-        if not locus_id and 'ID' in feature.attributes:
-            raw_id = feature.attributes['ID'][0]
-            if ':' in raw_id:
-                locus_id = raw_id.split(':')[-1]
-            else:
-                locus_id = raw_id
+    # Extract from ID if not found (e.g., "gene:AT1G01010" -> "AT1G01010")
+    if not locus_id:
+        raw_ids = get('ID')
+        if raw_ids is not None:
+            locus_id = raw_ids[0].rsplit(':', 1)[-1]
 
-        if not locus_id:
-            locus_id = feature.id.split(':')[-1] if feature.id and ':' in feature.id else feature.id
+    if not locus_id:
+        locus_id = feature.id.rsplit(':', 1)[-1] if feature.id else feature.id
 
-        # Symbol for transcript (usually Name like "NAC001-201")
-        if 'Name' in feature.attributes:
-            val = feature.attributes['Name'][0]
-            if val and val != '.' and val != locus_id:
-                symbol = val
+    symbol = None
+    for attr in symbol_attrs:
+        val = first(attr)
+        if val and val != locus_id:
+            symbol = val
+            break
 
     # Format: "LOCUS_ID (SYMBOL)" or just "LOCUS_ID"
     if symbol:
@@ -150,82 +247,344 @@ def gene_to_bed12(feature, label: str) -> str:
     Genes span the entire locus (including introns), so they should be
     represented as simple contiguous blocks, not compound exon structures.
     """
-    chrom = feature.chrom
     start = feature.start - 1  # GFF is 1-based, BED is 0-based
     end = feature.end
-    strand = feature.strand if feature.strand else '.'
-    score = 0
-    thick_start = start
-    thick_end = end
-    item_rgb = "0,0,0"
-    block_count = 1
-    block_sizes = str(end - start)
-    block_starts = "0"
+    return SINGLE_BLOCK_BED12 % (
+        feature.chrom, start, end, label, feature.strand or '.', start, end, end - start,
+    )
 
-    return f"{chrom}\t{start}\t{end}\t{label}\t{score}\t{strand}\t{thick_start}\t{thick_end}\t{item_rgb}\t{block_count}\t{block_sizes},\t{block_starts},"
 
+class GffFeature(NamedTuple):
+    """Minimal stand-in for gffutils.Feature, built by the streaming parser."""
+    chrom: str
+    featuretype: str
+    start: int
+    end: int
+    score: str
+    strand: str
+    id: str
+    attributes: dict
 
-def transcript_to_bed12(feature, db, label: str) -> str:
-    """Convert a transcript feature to BED12 format with exon blocks.
 
-    Transcripts have exon structure that should be shown as compound blocks.
-    Uses gffutils to extract the exon positions for proper visualization.
+def parse_attributes(raw: str) -> dict:
+    """Parse a GFF3 column 9 string the way gffutils does (unquoted values, in file order)."""
+    attributes = {}
+    for item in raw.split(';'):
+        if not item:
+            continue
+        key, _, value = item.strip().partition('=')
+        # An empty value has no entries, as in gffutils ("Name=" -> [])
+        values = value.split(',') if value else []
+        # Most values have no escapes and only one entry; skip work for those
+        if '%' in value:
+            values = [unquote(v) for v in values]
+        attributes[key] = values
+    return attributes
+
+
+def blocks_to_bed12(feature, label: str, exons: list[tuple[int, int]],
+                    cds: list[tuple[int, int]]) -> str:
+    """Convert a transcript and its exon/CDS (start, end) pairs to BED12.
+
+    Follows the rules of gffutils' FeatureDB.bed12(): exons become blocks,
+    the CDS span sets the thick region, and a transcript whose exons don't
+    span it exactly is emitted as a single block.
     """
-    try:
-        # Get BED12 with exon structure from gffutils
-        bed12 = db.bed12(feature, name_field='ID')
-        fields = bed12.split('\t')
-        fields[3] = label  # Replace name field with our formatted label
-        return '\t'.join(fields)
-    except Exception:
-        # Fallback: create simple BED12 entry if exon extraction fails
-        chrom = feature.chrom
-        start = feature.start - 1  # GFF is 1-based, BED is 0-based
-        end = feature.end
-        strand = feature.strand if feature.strand else '.'
-        score = 0
-        thick_start = start
-        thick_end = end
-        item_rgb = "0,0,0"
-        block_count = 1
-        block_sizes = str(end - start)
-        block_starts = "0"
-
-        return f"{chrom}\t{start}\t{end}\t{label}\t{score}\t{strand}\t{thick_start}\t{thick_end}\t{item_rgb}\t{block_count}\t{block_sizes},\t{block_starts},"
-
-
-def extract_features(gff3_path: Path) -> tuple[list[str], list[str]]:
+    exons = sorted(exons, key=itemgetter(0)) or [(feature.start, feature.end)]
+    if exons[0][0] != feature.start or exons[-1][1] != feature.end:
+        return gene_to_bed12(feature, label)
+
+    start = feature.start - 1  # GFF is 1-based, BED is 0-based
+    if cds:
+        cds = sorted(cds, key=itemgetter(0))
+        thick_start = cds[0][0] - 1
+        thick_end = cds[-1][1]
+    else:
+        # gffutils leaves thickStart 1-based when there is no CDS
+        thick_start = feature.start
+        thick_end = feature.end
+    score = feature.score if feature.score != '.' else '0'
+    block_sizes = ','.join([str(e - s + 1) for s, e in exons])
+    block_starts = ','.join([str(s - 1 - start) for s, _ in exons])
+
+    return MULTI_BLOCK_BED12 % (
+        feature.chrom, start, feature.end, label, score, feature.strand,
+        thick_start, thick_end, len(exons), block_sizes, block_starts,
+    )
+
+
+def extract_features_stream(gff3_path: Path, gene_out: TextIO,
+                            tx_out: TextIO) -> Optional[tuple[int, int]]:
     """
-    Extract gene and transcript features from GFF3.
+    Extract gene and transcript features in a single pass, without a database.
+
+    Relies on the usual Ensembl/GENCODE layout where each gene's rows are
+    grouped together and children follow their parents. Transcripts are
+    held only until the next top-level feature starts, then written out.
+
+    Returns:
+        (gene_count, transcript_count), or None if the file doesn't fit that
+        layout (or has no genes/transcripts) and needs gffutils. Partial
+        output may have been written to gene_out/tx_out in that case.
+    """
+    # mRNA lines go straight to tx_out; 'transcript' lines are only wanted
+    # if the file turns out to have no mRNA, so they are spilled to disk
+    tx_spill = tempfile.TemporaryFile('w+', dir=TEMP_DIR)
+    tx_outs = {'mRNA': tx_out, 'transcript': tx_spill}
+    counts = {'gene': 0, 'mRNA': 0, 'transcript': 0}
+
+    # Transcripts (and their exon/CDS blocks) of the current gene block
+    transcripts = {}
+    exons = {}
+    cds = {}
+    # IDs of every non-exon/CDS feature so far, to tell a parent we have
+    # already passed (fine, or out of order if it was flushed) from a
+    # forward reference (out of order)
+    seen_ids = set()
+    flushed = set()
+    auto_ids = {}
+
+    def flush():
+        for tx_id, tx in transcripts.items():
+            try:
+                label = format_label(tx, is_gene=False)
+            except IndexError:
+                continue  # skipped, as on the gffutils path
+            tx_outs[tx.featuretype].write(blocks_to_bed12(tx, label, exons[tx_id], cds[tx_id]) + '\n')
+            counts[tx.featuretype] += 1
+        flushed.update(transcripts)
+        transcripts.clear()
+        exons.clear()
+        cds.clear()
+
+    opener = gzip.open if gff3_path.suffix == '.gz' else open
+    with opener(gff3_path, 'rt') as f, tx_spill:
+        for line in f:
+            if line.startswith('#'):
+                if line.startswith('##FASTA'):
+                    break
+                continue
+            if line.startswith('>'):
+                break
+            fields = line.rstrip('\n\r').split('\t')
+            if len(fields) != 9:
+                continue
+
+            ftype = fields[2]
+            if ftype == 'exon' or ftype == 'CDS':
+                blocks = exons if ftype == 'exon' else cds
+                block = (int(fields[3]), int(fields[4]))
+                for item in fields[8].split(';'):
+                    item = item.strip()
+                    if item.startswith('Parent='):
+                        for parent in item[7:].split(','):
+                            if '%' in parent:
+                                parent = unquote(parent)
+                            if parent in transcripts:
+                                blocks[parent].append(block)
+                            elif parent in flushed or parent not in seen_ids:
+                                return None
+                continue
+
+            attributes = parse_attributes(fields[8])
+            if 'Parent' not in attributes:
+                flush()
+
+            if attributes.get('ID'):
+                feature_id = attributes['ID'][0]
+            else:
+                auto_ids[ftype] = auto_ids.get(ftype, 0) + 1
+                feature_id = f"{ftype}_{auto_ids[ftype]}"
+            if feature_id in seen_ids:
+                return None
+            seen_ids.add(feature_id)
+
+            if ftype == 'gene' or ftype in tx_outs:
+                feature = GffFeature(fields[0], ftype, int(fields[3]), int(fields[4]),
+                                     fields[5], fields[6], feature_id, attributes)
+                if ftype == 'gene':
+                    try:
+                        label = format_label(feature, is_gene=True)
+                    except IndexError:
+                        continue  # skipped, as on the gffutils path
+                    gene_out.write(gene_to_bed12(feature, label) + '\n')
+                    counts['gene'] += 1
+                else:
+                    transcripts[feature_id] = feature
+                    exons[feature_id] = []
+                    cds[feature_id] = []
+        flush()
+
+        # Same precedence as the gffutils path: mRNA if present, else transcript
+        if counts['mRNA']:
+            transcript_count = counts['mRNA']
+        else:
+            transcript_count = counts['transcript']
+            tx_spill.seek(0)
+            shutil.copyfileobj(tx_spill, tx_out)
+
+    gene_count = counts['gene']
+    if not gene_count and not transcript_count:
+        return None
+
+    print(f"  Extracted {gene_count} genes, {transcript_count} transcripts")
+    return gene_count, transcript_count
+
+
+def extract_features_native(gff3_path: Path, gene_out: TextIO,
+                            tx_out: TextIO) -> Optional[tuple[int, int]]:
+    """
+    Run the native gff3-to-bed12 parser, writing to gene_out/tx_out's files.
+
+    Produces the same output as extract_features_stream.
 
     Returns:
-        (gene_bed_lines, transcript_bed_lines)
+        (gene_count, transcript_count), or None if the file needs gffutils.
     """
-    print(f"  Creating gffutils database...")
+    for out in (gene_out, tx_out):
+        out.flush()
+    result = subprocess.run(
+        [str(ACCELERATOR), str(gff3_path), gene_out.name, tx_out.name],
+        capture_output=True, text=True
+    )
+    for out in (gene_out, tx_out):
+        out.seek(0, os.SEEK_END)
+
+    if result.returncode == ACCELERATOR_FALLBACK:
+        return None
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"exit status {result.returncode}")
 
-    db = gffutils.create_db(
-        str(gff3_path),
-        ":memory:",
-        merge_strategy="create_unique",
+    gene_count, transcript_count = map(int, result.stdout.split())
+    print(f"  Extracted {gene_count} genes, {transcript_count} transcripts")
+    return gene_count, transcript_count
+
+
+def collect_blocks(db, featuretype: str) -> dict[str, list[tuple[int, int]]]:
+    """Map each parent ID to the (start, end) of its descendants of one type.
+
+    Fetches every relation in a single query, rather than one children()
+    query per transcript as FeatureDB.bed12() does.
+    """
+    blocks = defaultdict(list)
+    rows = db.conn.execute(
+        """
+        SELECT DISTINCT relations.parent, features.id, features.start, features.end
+        FROM relations JOIN features ON relations.child = features.id
+        WHERE features.featuretype = ?
+        """,
+        (featuretype,),
+    )
+    for parent, _, start, end in rows:
+        blocks[parent].append((start, end))
+    return blocks
+
+
+def transcript_to_bed12(feature, label: str, exons_by_parent: dict, cds_by_parent: dict) -> str:
+    """Convert a transcript feature to BED12 format with exon blocks.
+
+    Transcripts have exon structure that should be shown as compound blocks.
+    Exon and CDS positions come from the maps built by collect_blocks().
+    """
+    return blocks_to_bed12(
+        feature,
+        label,
+        exons_by_parent.get(feature.id, []),
+        cds_by_parent.get(feature.id, []),
+    )
+
+
+def open_db(gff3_path: Path, db_path: Path):
+    """Open the gffutils database for a GFF3, building it only if stale.
+
+    The database is kept on disk between runs and reused as long as it is
+    newer than the GFF3 it was built from.
+    """
+    if db_path.exists() and db_path.stat().st_mtime > gff3_path.stat().st_mtime:
+        print(f"  Using cached gffutils database: {db_path}")
+    else:
+        print(f"  Creating gffutils database...")
+        # Build under a temporary name so an interrupted run never leaves a
+        # half-written database that looks fresh.
+        partial_path = db_path.with_name(db_path.name + ".partial")
+        gffutils.create_db(
+            str(gff3_path),
+            str(partial_path),
+            force=True,
+            merge_strategy="create_unique",
+            keep_order=True,
+            sort_attribute_values=True,
+            pragmas=DB_PRAGMAS,
+        )
+        partial_path.replace(db_path)
+
+    return gffutils.FeatureDB(
+        str(db_path),
         keep_order=True,
         sort_attribute_values=True,
+        pragmas=DB_PRAGMAS,
     )
 
-    gene_lines = []
-    transcript_lines = []
+
+def extract_features(gff3_path: Path, db_path: Path, gene_out: TextIO,
+                     tx_out: TextIO) -> tuple[int, int]:
+    """
+    Extract gene and transcript features from GFF3.
+
+    BED12 lines are written to gene_out/tx_out as they are produced rather
+    than collected in memory.
+
+    Returns:
+        (gene_count, transcript_count)
+    """
+    result = None
+    if ACCELERATOR.exists():
+        print(f"  Streaming GFF3 (native)...")
+        try:
+            result = extract_features_native(gff3_path, gene_out, tx_out)
+        except Exception as e:
+            print(f"  Warning: native parser failed ({e}), using Python parser...")
+            for out in (gene_out, tx_out):
+                out.seek(0)
+                out.truncate()
+            result = extract_features_stream(gff3_path, gene_out, tx_out)
+    else:
+        print(f"  Streaming GFF3...")
+        result = extract_features_stream(gff3_path, gene_out, tx_out)
+    if result is not None:
+        return result
+
+    print(f"  GFF3 layout not suitable for streaming, falling back to gffutils...")
+    for out in (gene_out, tx_out):
+        out.seek(0)
+        out.truncate()
+    return extract_features_db(gff3_path, db_path, gene_out, tx_out)
+
+
+def extract_features_db(gff3_path: Path, db_path: Path, gene_out: TextIO,
+                        tx_out: TextIO) -> tuple[int, int]:
+    """
+    Extract gene and transcript features through a gffutils database.
+
+    Handles any GFF3 layout; the streaming parsers must produce the same
+    output for the files they accept.
+
+    Returns:
+        (gene_count, transcript_count)
+    """
+    db = open_db(gff3_path, db_path)
 
     # Extract gene features
     gene_count = 0
     for ftype in ['gene']:
         try:
-            features = list(db.features_of_type(ftype))
-            if features:
-                print(f"  Found {len(features)} {ftype} features")
-                for feature in features:
+            count = db.count_features_of_type(ftype)
+            if count:
+                print(f"  Found {count} {ftype} features")
+                for feature in db.features_of_type(ftype):
                     try:
                         label = format_label(feature, is_gene=True)
-                        bed12 = gene_to_bed12(feature, label)
-                        gene_lines.append(bed12)
+                        gene_out.write(gene_to_bed12(feature, label) + '\n')
                         gene_count += 1
                     except Exception:
                         continue
@@ -237,14 +596,15 @@ def extract_features(gff3_path: Path) -> tuple[list[str], list[str]]:
     transcript_count = 0
     for ftype in ['mRNA', 'transcript']:
         try:
-            features = list(db.features_of_type(ftype))
-            if features:
-                print(f"  Found {len(features)} {ftype} features")
-                for feature in features:
+            count = db.count_features_of_type(ftype)
+            if count:
+                print(f"  Found {count} {ftype} features")
+                exons_by_parent = collect_blocks(db, 'exon')
+                cds_by_parent = collect_blocks(db, 'CDS')
+                for feature in db.features_of_type(ftype):
                     try:
                         label = format_label(feature, is_gene=False)
-                        bed12 = transcript_to_bed12(feature, db, label)
-                        transcript_lines.append(bed12)
+                        tx_out.write(transcript_to_bed12(feature, label, exons_by_parent, cds_by_parent) + '\n')
                         transcript_count += 1
                     except Exception:
                         continue
@@ -254,85 +614,130 @@ def extract_features(gff3_path: Path) -> tuple[list[str], list[str]]:
 
     # If no genes found but transcripts exist, that's OK
     # If no transcripts found, try CDS as fallback (for bacteria)
-    if not transcript_lines and not gene_lines:
+    if not transcript_count and not gene_count:
         print("  No gene/mRNA features, trying CDS...")
         for ftype in ['CDS']:
             try:
-                features = list(db.features_of_type(ftype))
-                if features:
-                    print(f"  Found {len(features)} {ftype} features")
-                    for feature in features:
+                count = db.count_features_of_type(ftype)
+                if count:
+                    print(f"  Found {count} {ftype} features")
+                    for feature in db.features_of_type(ftype):
                         try:
                             label = format_label(feature, is_gene=True)
-                            bed12 = gene_to_bed12(feature, label)
-                            gene_lines.append(bed12)
+                            gene_out.write(gene_to_bed12(feature, label) + '\n')
+                            gene_count += 1
                         except Exception:
                             continue
                     break
             except Exception:
                 continue
 
-    print(f"  Extracted {len(gene_lines)} genes, {len(transcript_lines)} transcripts")
-    return gene_lines, transcript_lines
+    print(f"  Extracted {gene_count} genes, {transcript_count} transcripts")
+    return gene_count, transcript_count
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_fingerprint(gff3_path: Path, genome_config: dict) -> dict:
+    """Hashes of everything a genome's BigBed output depends on.
+
+    Covers the GFF3 itself, the chromosome names/lengths used for chrom.sizes
+    and filtering, and this script (plus the native parser, when it is built),
+    so any edit to the conversion logic invalidates earlier outputs.
+    """
+    chromosomes = [[c['name'], c['length']] for c in genome_config['chromosomes']]
+    fingerprint = {
+        'gff3_sha256': file_sha256(gff3_path),
+        'chrom_sizes_sha256': hashlib.sha256(json.dumps(chromosomes).encode()).hexdigest(),
+        'code_sha256': file_sha256(Path(__file__)),
+    }
+    if ACCELERATOR.exists():
+        fingerprint['accelerator_sha256'] = file_sha256(ACCELERATOR)
+    return fingerprint
+
 
+def create_chrom_sizes(genome_config: dict) -> tuple[Path, dict[str, int]]:
+    """Create chrom.sizes file from genome config.
 
-def create_chrom_sizes(genome_config: dict) -> Path:
-    """Create chrom.sizes file from genome config."""
+    Returns:
+        (chrom_sizes_path, {chrom: length})
+    """
     chrom_sizes_path = TEMP_DIR / f"{genome_config['id']}.chrom.sizes"
+    chrom_sizes = {
+        sys.intern(chrom['name']): chrom['length'] for chrom in genome_config['chromosomes']
+    }
 
     with open(chrom_sizes_path, 'w') as f:
-        for chrom in genome_config['chromosomes']:
-            f.write(f"{chrom['name']}\t{chrom['length']}\n")
+        for chrom, length in chrom_sizes.items():
+            f.write(f"{chrom}\t{length}\n")
 
-    return chrom_sizes_path
+    return chrom_sizes_path, chrom_sizes
 
 
-def create_bigbed(bed_lines: list[str], output_path: Path, chrom_sizes_path: Path,
-                  genome_id: str, track_type: str) -> bool:
-    """Create BigBed file from BED lines."""
-    if not bed_lines:
+def create_bigbed(bed_path: Path, output_path: Path, chrom_sizes_path: Path,
+                  chrom_sizes: dict[str, int], genome_id: str, track_type: str) -> bool:
+    """Create BigBed file from a BED12 file."""
+    if bed_path.stat().st_size == 0:
         return False
 
     bed_to_bigbed = ensure_tools()
 
-    # Write BED12 file
-    bed12_path = TEMP_DIR / f"{genome_id}.{track_type}.bed12"
-    with open(bed12_path, 'w') as f:
-        for line in bed_lines:
-            f.write(line + '\n')
-
-    # Sort BED file
-    sorted_bed_path = TEMP_DIR / f"{genome_id}.{track_type}.sorted.bed12"
-    with open(sorted_bed_path, 'w') as f:
-        subprocess.run(
-            ['sort', '-k1,1', '-k2,2n', str(bed12_path)],
-            stdout=f,
-            check=True
-        )
-
-    # Read chrom sizes for filtering
-    chrom_sizes = {}
-    with open(chrom_sizes_path) as f:
-        for line in f:
-            parts = line.strip().split('\t')
-            chrom_sizes[parts[0]] = int(parts[1])
-
-    # Filter out-of-bounds entries
+    # Filter out-of-bounds entries line by line, noting whether the output
+    # is already in the order bedToBigBed needs: each chrom in one contiguous
+    # run, with non-decreasing starts within it (the chroms themselves can
+    # come in any order). Curated GFF3s usually are, in which case nothing
+    # is held in memory.
     filtered_path = TEMP_DIR / f"{genome_id}.{track_type}.filtered.bed12"
-    with open(sorted_bed_path) as f_in, open(filtered_path, 'w') as f_out:
+    in_order = True
+    seen_chroms = set()
+    last_chrom = None
+    last_start = -1
+    with open(bed_path) as f_in, open(filtered_path, 'w', buffering=WRITE_BUFFER_SIZE) as f_out:
         for line in f_in:
-            parts = line.strip().split('\t')
-            chrom = parts[0]
-            start = int(parts[1])
-            end = int(parts[2])
-
-            if chrom in chrom_sizes:
-                if start >= 0 and end <= chrom_sizes[chrom]:
-                    f_out.write(line)
-
-    # Convert to BigBed
+            chrom, start, end, _ = line.split('\t', 3)
+            # chrom_sizes keys are interned, so the lookups below hit on identity
+            chrom = sys.intern(chrom)
+            start = int(start)
+            end = int(end)
+            if chrom in chrom_sizes and start >= 0 and end <= chrom_sizes[chrom]:
+                if chrom is not last_chrom:
+                    if chrom in seen_chroms:
+                        in_order = False
+                    seen_chroms.add(chrom)
+                    last_chrom = chrom
+                elif start < last_start:
+                    in_order = False
+                last_start = start
+                f_out.write(line)
+
+    if not in_order:
+        # Chrom names come from a small set, so intern them rather than
+        # keeping a separate copy per record
+        records = []
+        with open(filtered_path) as f:
+            for line in f:
+                chrom, start, _ = line.split('\t', 2)
+                records.append((sys.intern(chrom), int(start), line))
+        records.sort(key=itemgetter(0, 1))
+        # writelines streams the lines out rather than joining a second copy
+        with open(filtered_path, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+            f.writelines(r[2] for r in records)
+
+    # Convert to BigBed. The BED has to be a real file rather than a pipe:
+    # bedToBigBed reads its input twice (once to size the index, once to
+    # write records) and rewinds in between, which stdin/FIFOs can't do.
+    # Output goes to a temporary name and is renamed on success, so a failed
+    # run never leaves a truncated .bb for upload-r2.sh to pick up.
     print(f"  Creating BigBed: {output_path}")
 
+    partial_path = output_path.with_name(output_path.name + ".partial")
     result = subprocess.run(
         [
             str(bed_to_bigbed),
@@ -340,16 +745,21 @@ def create_bigbed(bed_lines: list[str], output_path: Path, chrom_sizes_path: Pat
             '-tab',
             str(filtered_path),
             str(chrom_sizes_path),
-            str(output_path)
+            str(partial_path)
         ],
         capture_output=True,
         text=True
     )
+    # Free the intermediate now rather than at end-of-genome cleanup
+    filtered_path.unlink()
 
     if result.returncode != 0:
         print(f"  ERROR: bedToBigBed failed: {result.stderr}")
+        partial_path.unlink(missing_ok=True)
         return False
 
+    partial_path.replace(output_path)
+
     # Report size
     size = output_path.stat().st_size
     if size > 1024 * 1024:
@@ -361,7 +771,7 @@ def create_bigbed(bed_lines: list[str], output_path: Path, chrom_sizes_path: Pat
     return True
 
 
-def convert_genome(genome_id: str, config: dict) -> bool:
+def convert_genome(genome_id: str, config: dict, force: bool = False) -> bool:
     """Convert a single genome from GFF3 to BigBed."""
 
     genome_config = None
@@ -381,56 +791,91 @@ def convert_genome(genome_id: str, config: dict) -> bool:
     OUTPUT_DIR.mkdir(exist_ok=True)
 
     # Download GFF3 if needed
-    gff3_path = TEMP_DIR / f"{genome_id}.gff3"
-    if not gff3_path.exists():
-        url = genome_config['gff3_url']
-        print(f"  Downloading GFF3...")
-
-        if url.endswith('.gz'):
-            compressed_path = TEMP_DIR / f"{genome_id}.gff3.gz"
-            urllib.request.urlretrieve(url, compressed_path)
-
-            with gzip.open(compressed_path, 'rb') as f_in:
-                with open(gff3_path, 'wb') as f_out:
-                    f_out.write(f_in.read())
-
-            compressed_path.unlink()
-        else:
-            urllib.request.urlretrieve(url, gff3_path)
-    else:
-        print(f"  Using cached GFF3: {gff3_path}")
-
-    # Extract gene and transcript features
-    gene_lines, transcript_lines = extract_features(gff3_path)
-
-    if not gene_lines and not transcript_lines:
+    gff3_path = fetch_gff3(genome_id, genome_config['gff3_url'])
+
+    # Skip the whole pipeline if the outputs were built from identical inputs
+    meta_path = OUTPUT_DIR / f"{genome_id}.bb.meta"
+    fingerprint = build_fingerprint(gff3_path, genome_config)
+    # A missing, unreadable or incomplete meta file means a rebuild
+    meta = None if force else read_json_record(meta_path)
+    if meta:
+        outputs = meta.get('outputs')
+        if (meta.get('fingerprint') == fingerprint and outputs and isinstance(outputs, list)
+                and all((OUTPUT_DIR / name).exists() for name in outputs)):
+            print(f"  Up to date: {', '.join(outputs)}")
+            return True
+
+    # The outputs are about to be rewritten, so the old record no longer
+    # describes them (a partly failed rebuild must not look up to date)
+    meta_path.unlink(missing_ok=True)
+
+    # Extract gene and transcript features to per-track BED12 files
+    db_path = TEMP_DIR / f"{genome_id}.gffutils.db"
+    genes_bed_path = TEMP_DIR / f"{genome_id}.genes.bed12"
+    transcripts_bed_path = TEMP_DIR / f"{genome_id}.transcripts.bed12"
+    with open(genes_bed_path, 'w', buffering=WRITE_BUFFER_SIZE) as gene_out, \
+            open(transcripts_bed_path, 'w', buffering=WRITE_BUFFER_SIZE) as tx_out:
+        gene_count, transcript_count = extract_features(gff3_path, db_path, gene_out, tx_out)
+
+    if not gene_count and not transcript_count:
         print(f"  ERROR: No features found in GFF3")
         return False
 
     # Create chrom.sizes
-    chrom_sizes_path = create_chrom_sizes(genome_config)
+    chrom_sizes_path, chrom_sizes = create_chrom_sizes(genome_config)
 
     success = False
+    created = []
+    failed = False
 
     # Create genes BigBed if we have genes
-    if gene_lines:
+    if gene_count:
         genes_output = OUTPUT_DIR / f"{genome_id}.genes.bb"
-        if create_bigbed(gene_lines, genes_output, chrom_sizes_path, genome_id, "genes"):
+        if create_bigbed(genes_bed_path, genes_output, chrom_sizes_path, chrom_sizes,
+                         genome_id, "genes"):
             success = True
+            created.append(genes_output.name)
+        else:
+            failed = True
 
     # Create transcripts BigBed if we have transcripts (and they're different from genes)
-    if transcript_lines:
+    if transcript_count:
         transcripts_output = OUTPUT_DIR / f"{genome_id}.transcripts.bb"
-        if create_bigbed(transcript_lines, transcripts_output, chrom_sizes_path, genome_id, "transcripts"):
+        if create_bigbed(transcripts_bed_path, transcripts_output, chrom_sizes_path, chrom_sizes,
+                         genome_id, "transcripts"):
             success = True
+            created.append(transcripts_output.name)
+        else:
+            failed = True
 
-    # Cleanup temp files
+    # Record what the outputs were built from, only if every track succeeded
+    if success and not failed:
+        write_json_record(meta_path, {'fingerprint': fingerprint, 'outputs': created})
+
+    # Cleanup temp files (the gffutils database is kept for re-runs)
     for f in TEMP_DIR.glob(f"{genome_id}.*"):
-        f.unlink()
+        if f != db_path:
+            f.unlink()
 
     return success
 
 
+def convert_genome_captured(genome_id: str, config: dict, force: bool = False) -> tuple[bool, str]:
+    """Run convert_genome with its output captured, for parallel workers.
+
+    Returns (success, output) so each genome's log can be printed in one
+    piece instead of interleaved with the other workers'.
+    """
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            success = convert_genome(genome_id, config, force)
+        except Exception as e:
+            print(f"ERROR: {genome_id} failed: {e}")
+            success = False
+    return success, output.getvalue()
+
+
 def list_genomes(config: dict):
     """List available genomes."""
     print("Available genomes:")
@@ -443,6 +888,10 @@ def main():
     parser.add_argument('genome_id', nargs='?', help="Genome ID to convert")
     parser.add_argument('--all', action='store_true', help="Convert all genomes")
     parser.add_argument('--list', action='store_true', help="List available genomes")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help="Genomes to convert in parallel with --all (default: CPU count)")
+    parser.add_argument('--force', action='store_true',
+                        help="Rebuild even if outputs are up to date with their inputs")
 
     args = parser.parse_args()
 
@@ -453,10 +902,27 @@ def main():
         return
 
     if args.all:
-        failed = []
-        for g in config['genomes']:
-            if not convert_genome(g['id'], config):
-                failed.append(g['id'])
+        # Fetch bedToBigBed up front so parallel workers don't race to download it
+        ensure_tools()
+
+        # Genomes are independent (per-genome temp files), so convert in parallel;
+        # each worker's output is printed whole once its genome is done
+        results = {}
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = {
+                executor.submit(convert_genome_captured, g['id'], config, args.force): g['id']
+                for g in config['genomes']
+            }
+            for future in as_completed(futures):
+                genome_id = futures[future]
+                try:
+                    results[genome_id], output = future.result()
+                    print(output, end='', flush=True)
+                except Exception as e:
+                    print(f"ERROR: {genome_id} failed: {e}")
+                    results[genome_id] = False
+
+        failed = [g['id'] for g in config['genomes'] if not results[g['id']]]
 
         print("\n" + "=" * 50)
         print(f"Conversion complete. Output in {OUTPUT_DIR}")
@@ -465,7 +931,8 @@ def main():
         return
 
     if args.genome_id:
-        convert_genome(args.genome_id, config)
+        ensure_tools()
+        convert_genome(args.genome_id, config, args.force)
         return
 
     parser.print_help()
@@ -0,0 +1,424 @@
+//! Native build of the streaming GFF3 -> BED12 parser in convert_gffutils.py.
+//!
+//! This is a line-for-line port of `extract_features_stream()` and the label
+//! and BED12 helpers it uses. convert_gffutils.py runs it instead of the
+//! Python parser when it has been built, so its output must stay
+//! byte-identical to the Python implementation (checked by ../tests/).
+//!
+//! Usage:
+//!     gff3-to-bed12 <in.gff3[.gz]> <genes.bed12> <transcripts.bed12>
+//!
+//! On success prints "<gene_count> <transcript_count>". Exits with status 3
+//! when the file needs the gffutils fallback (not grouped by gene, forward
+//! Parent references, duplicate IDs, or no gene/transcript features).
+
+use std::collections::{HashMap, HashSet};
+use std::env;
+use std::fs::{self, File};
+use std::io::{self, BufRead, BufReader, BufWriter, Read, Write};
+use std::path::Path;
+use std::process::ExitCode;
+
+use flate2::read::MultiGzDecoder;
+
+const NEEDS_FALLBACK: u8 = 3;
+const BUFFER_SIZE: usize = 1024 * 1024;
+
+type Attributes = HashMap<String, Vec<String>>;
+
+/// A gene or transcript row, as `GffFeature` in the Python version.
+struct Feature {
+    chrom: String,
+    featuretype: String,
+    start: i64,
+    end: i64,
+    score: String,
+    strand: String,
+    id: String,
+    attributes: Attributes,
+}
+
+/// Transcripts (and their exon/CDS blocks) of the current gene block.
+struct Transcript {
+    feature: Feature,
+    exons: Vec<(i64, i64)>,
+    cds: Vec<(i64, i64)>,
+}
+
+/// The file doesn't fit the streaming layout; convert_gffutils.py falls back
+/// to gffutils.
+struct Fallback;
+
+enum Error {
+    Fallback,
+    Io(io::Error),
+}
+
+impl From<io::Error> for Error {
+    fn from(e: io::Error) -> Self {
+        Error::Io(e)
+    }
+}
+
+impl From<Fallback> for Error {
+    fn from(_: Fallback) -> Self {
+        Error::Fallback
+    }
+}
+
+/// Decode %XX escapes like Python's urllib.parse.unquote.
+fn unquote(value: &str) -> String {
+    if !value.contains('%') {
+        return value.to_string();
+    }
+    let bytes = value.as_bytes();
+    let mut out = Vec::with_capacity(bytes.len());
+    let mut i = 0;
+    while i < bytes.len() {
+        if bytes[i] == b'%' && i + 2 < bytes.len() {
+            let hex = |b: u8| (b as char).to_digit(16);
+            if let (Some(hi), Some(lo)) = (hex(bytes[i + 1]), hex(bytes[i + 2])) {
+                out.push((hi * 16 + lo) as u8);
+                i += 3;
+                continue;
+            }
+        }
+        out.push(bytes[i]);
+        i += 1;
+    }
+    String::from_utf8_lossy(&out).into_owned()
+}
+
+/// Parse a GFF3 column 9 string the way gffutils does (unquoted values, in file order).
+fn parse_attributes(raw: &str) -> Attributes {
+    let mut attributes = Attributes::new();
+    for item in raw.split(';') {
+        if item.is_empty() {
+            continue;
+        }
+        let item = item.trim();
+        let (key, value) = item.split_once('=').unwrap_or((item, ""));
+        // An empty value has no entries, as in gffutils ("Name=" -> [])
+        let values: Vec<String> = if value.is_empty() {
+            Vec::new()
+        } else {
+            value.split(',').map(unquote).collect()
+        };
+        attributes.insert(key.to_string(), values);
+    }
+    attributes
+}
+
+fn parse_int(field: &str) -> Result<i64, Fallback> {
+    field.parse().map_err(|_| Fallback)
+}
+
+/// Last ':'-separated part of an ID ("gene:AT1G01010" -> "AT1G01010").
+fn strip_prefix(id: &str) -> &str {
+    id.rsplit(':').next().unwrap_or(id)
+}
+
+/// An attribute is present with no value (e.g. "Name="); such features are
+/// skipped, as on the gffutils path.
+struct Unlabelled;
+
+/// First value of attr, or None if missing or a '.' placeholder.
+fn first<'a>(attributes: &'a Attributes, attr: &str) -> Result<Option<&'a str>, Unlabelled> {
+    let Some(values) = attributes.get(attr) else {
+        return Ok(None);
+    };
+    let val = values.first().ok_or(Unlabelled)?;
+    if val.is_empty() || val == "." {
+        Ok(None)
+    } else {
+        Ok(Some(val))
+    }
+}
+
+/// Format label as: LOCUS_ID (SYMBOL) or just LOCUS_ID
+fn format_label(feature: &Feature, is_gene: bool) -> Result<String, Unlabelled> {
+    let attributes = &feature.attributes;
+    let (mut locus_id, symbol_attrs): (Option<&str>, &[&str]) = if is_gene {
+        let locus_id = match first(attributes, "gene_id")? {
+            Some(id) => Some(id),
+            None => first(attributes, "locus_tag")?,
+        };
+        (locus_id, &["Name", "gene", "gene_name"])
+    } else {
+        (first(attributes, "transcript_id")?, &["Name"])
+    };
+
+    if locus_id.is_none() {
+        if let Some(raw_ids) = attributes.get("ID") {
+            locus_id = Some(strip_prefix(raw_ids.first().ok_or(Unlabelled)?));
+        }
+    }
+    let locus_id = match locus_id {
+        Some(id) if !id.is_empty() => id,
+        _ => strip_prefix(&feature.id),
+    };
+
+    let mut symbol = None;
+    for attr in symbol_attrs {
+        if let Some(val) = first(attributes, attr)? {
+            if val != locus_id {
+                symbol = Some(val);
+                break;
+            }
+        }
+    }
+
+    Ok(match symbol {
+        Some(symbol) => format!("{locus_id} ({symbol})"),
+        None if locus_id.is_empty() => "unknown".to_string(),
+        None => locus_id.to_string(),
+    })
+}
+
+/// Convert a gene feature to simple single-block BED12 format.
+fn gene_to_bed12(out: &mut impl Write, feature: &Feature, label: &str) -> io::Result<()> {
+    let start = feature.start - 1; // GFF is 1-based, BED is 0-based
+    let end = feature.end;
+    let strand = if feature.strand.is_empty() { "." } else { &feature.strand };
+    writeln!(
+        out,
+        "{}\t{start}\t{end}\t{label}\t0\t{strand}\t{start}\t{end}\t0,0,0\t1\t{},\t0,",
+        feature.chrom,
+        end - start,
+    )
+}
+
+/// Convert a transcript and its exon/CDS blocks to BED12, following the
+/// rules of gffutils' FeatureDB.bed12().
+fn blocks_to_bed12(out: &mut impl Write, tx: &mut Transcript, label: &str) -> io::Result<()> {
+    let feature = &tx.feature;
+    let exons = &mut tx.exons;
+    exons.sort_by_key(|e| e.0);
+    if exons.is_empty() {
+        exons.push((feature.start, feature.end));
+    }
+    if exons[0].0 != feature.start || exons[exons.len() - 1].1 != feature.end {
+        return gene_to_bed12(out, feature, label);
+    }
+
+    let start = feature.start - 1; // GFF is 1-based, BED is 0-based
+    let (thick_start, thick_end) = if tx.cds.is_empty() {
+        // gffutils leaves thickStart 1-based when there is no CDS
+        (feature.start, feature.end)
+    } else {
+        tx.cds.sort_by_key(|c| c.0);
+        (tx.cds[0].0 - 1, tx.cds[tx.cds.len() - 1].1)
+    };
+    let score = if feature.score == "." { "0" } else { &feature.score };
+    let block_sizes: Vec<String> = exons.iter().map(|(s, e)| (e - s + 1).to_string()).collect();
+    let block_starts: Vec<String> = exons.iter().map(|(s, _)| (s - 1 - start).to_string()).collect();
+
+    writeln!(
+        out,
+        "{}\t{start}\t{}\t{label}\t{score}\t{}\t{thick_start}\t{thick_end}\t0,0,0\t{}\t{}\t{}",
+        feature.chrom,
+        feature.end,
+        feature.strand,
+        exons.len(),
+        block_sizes.join(","),
+        block_starts.join(","),
+    )
+}
+
+struct Outputs {
+    genes: BufWriter<File>,
+    mrna: BufWriter<File>,
+    // 'transcript' lines are only wanted if the file has no mRNA
+    spill: BufWriter<File>,
+    gene_count: usize,
+    mrna_count: usize,
+    transcript_count: usize,
+}
+
+fn flush(
+    transcripts: &mut Vec<Transcript>,
+    index: &mut HashMap<String, usize>,
+    flushed: &mut HashSet<String>,
+    outputs: &mut Outputs,
+) -> io::Result<()> {
+    for mut tx in transcripts.drain(..) {
+        let label = match format_label(&tx.feature, false) {
+            Ok(label) => label,
+            Err(Unlabelled) => {
+                flushed.insert(tx.feature.id);
+                continue;
+            }
+        };
+        if tx.feature.featuretype == "mRNA" {
+            blocks_to_bed12(&mut outputs.mrna, &mut tx, &label)?;
+            outputs.mrna_count += 1;
+        } else {
+            blocks_to_bed12(&mut outputs.spill, &mut tx, &label)?;
+            outputs.transcript_count += 1;
+        }
+        flushed.insert(tx.feature.id);
+    }
+    index.clear();
+    Ok(())
+}
+
+fn extract(input: &mut impl BufRead, outputs: &mut Outputs) -> Result<(), Error> {
+    let mut transcripts: Vec<Transcript> = Vec::new();
+    let mut index: HashMap<String, usize> = HashMap::new();
+    // IDs of every non-exon/CDS feature so far, to tell a parent we have
+    // already passed from a forward reference
+    let mut seen_ids: HashSet<String> = HashSet::new();
+    let mut flushed: HashSet<String> = HashSet::new();
+    let mut auto_ids: HashMap<String, usize> = HashMap::new();
+
+    let mut buf = String::new();
+    loop {
+        buf.clear();
+        if input.read_line(&mut buf)? == 0 {
+            break;
+        }
+        let line = buf.trim_end_matches(['\n', '\r']);
+        if line.starts_with('#') {
+            if line.starts_with("##FASTA") {
+                break;
+            }
+            continue;
+        }
+        if line.starts_with('>') {
+            break;
+        }
+        let fields: Vec<&str> = line.split('\t').collect();
+        if fields.len() != 9 {
+            continue;
+        }
+
+        let ftype = fields[2];
+        if ftype == "exon" || ftype == "CDS" {
+            let block = (parse_int(fields[3])?, parse_int(fields[4])?);
+            for item in fields[8].split(';') {
+                let Some(parents) = item.trim().strip_prefix("Parent=") else {
+                    continue;
+                };
+                for parent in parents.split(',') {
+                    let parent = unquote(parent);
+                    if let Some(&i) = index.get(&parent) {
+                        let tx = &mut transcripts[i];
+                        if ftype == "exon" { tx.exons.push(block) } else { tx.cds.push(block) }
+                    } else if flushed.contains(&parent) || !seen_ids.contains(&parent) {
+                        return Err(Error::Fallback);
+                    }
+                }
+            }
+            continue;
+        }
+
+        let attributes = parse_attributes(fields[8]);
+        if !attributes.contains_key("Parent") {
+            flush(&mut transcripts, &mut index, &mut flushed, outputs)?;
+        }
+
+        let feature_id = match attributes.get("ID").and_then(|ids| ids.first()) {
+            Some(id) => id.clone(),
+            None => {
+                let n = auto_ids.entry(ftype.to_string()).or_insert(0);
+                *n += 1;
+                format!("{ftype}_{n}")
+            }
+        };
+        if !seen_ids.insert(feature_id.clone()) {
+            return Err(Error::Fallback);
+        }
+
+        if ftype == "gene" || ftype == "mRNA" || ftype == "transcript" {
+            let feature = Feature {
+                chrom: fields[0].to_string(),
+                featuretype: ftype.to_string(),
+                start: parse_int(fields[3])?,
+                end: parse_int(fields[4])?,
+                score: fields[5].to_string(),
+                strand: fields[6].to_string(),
+                id: feature_id,
+                attributes,
+            };
+            if ftype == "gene" {
+                let Ok(label) = format_label(&feature, true) else {
+                    continue;
+                };
+                gene_to_bed12(&mut outputs.genes, &feature, &label)?;
+                outputs.gene_count += 1;
+            } else {
+                index.insert(feature.id.clone(), transcripts.len());
+                transcripts.push(Transcript { feature, exons: Vec::new(), cds: Vec::new() });
+            }
+        }
+    }
+    flush(&mut transcripts, &mut index, &mut flushed, outputs)?;
+    Ok(())
+}
+
+fn open_gff3(path: &Path) -> io::Result<Box<dyn BufRead>> {
+    let file = File::open(path)?;
+    let reader: Box<dyn Read> = if path.extension().is_some_and(|ext| ext == "gz") {
+        Box::new(MultiGzDecoder::new(BufReader::with_capacity(BUFFER_SIZE, file)))
+    } else {
+        Box::new(file)
+    };
+    Ok(Box::new(BufReader::with_capacity(BUFFER_SIZE, reader)))
+}
+
+fn create(path: &Path) -> io::Result<BufWriter<File>> {
+    Ok(BufWriter::with_capacity(BUFFER_SIZE, File::create(path)?))
+}
+
+fn run(gff3_path: &Path, genes_path: &Path, transcripts_path: &Path) -> Result<(usize, usize), Error> {
+    let spill_path = transcripts_path.with_extension("spill");
+    let mut outputs = Outputs {
+        genes: create(genes_path)?,
+        mrna: create(transcripts_path)?,
+        spill: create(&spill_path)?,
+        gene_count: 0,
+        mrna_count: 0,
+        transcript_count: 0,
+    };
+
+    let result = extract(&mut open_gff3(gff3_path)?, &mut outputs);
+    let Outputs { mut genes, mut mrna, spill, gene_count, mrna_count, transcript_count } = outputs;
+    genes.flush()?;
+    drop(spill.into_inner().map_err(|e| e.into_error())?);
+
+    // Same precedence as the gffutils path: mRNA if present, else transcript
+    let transcript_count = if mrna_count > 0 {
+        mrna_count
+    } else {
+        io::copy(&mut File::open(&spill_path)?, &mut mrna)?;
+        transcript_count
+    };
+    mrna.flush()?;
+    fs::remove_file(&spill_path)?;
+
+    result?;
+    if gene_count == 0 && transcript_count == 0 {
+        return Err(Error::Fallback);
+    }
+    Ok((gene_count, transcript_count))
+}
+
+fn main() -> ExitCode {
+    let args: Vec<String> = env::args().collect();
+    if args.len() != 4 {
+        eprintln!("usage: {} <in.gff3[.gz]> <genes.bed12> <transcripts.bed12>", args[0]);
+        return ExitCode::from(2);
+    }
+
+    match run(Path::new(&args[1]), Path::new(&args[2]), Path::new(&args[3])) {
+        Ok((genes, transcripts)) => {
+            println!("{genes} {transcripts}");
+            ExitCode::SUCCESS
+        }
+        Err(Error::Fallback) => ExitCode::from(NEEDS_FALLBACK),
+        Err(Error::Io(e)) => {
+            eprintln!("{}: {e}", args[1]);
+            ExitCode::FAILURE
+        }
+    }
+}
@@ -0,0 +1,90 @@
+"""
+Checks that the streaming GFF3 parsers produce the same BED12 as the
+gffutils path.
+
+Each GFF3 in tests/data is converted through gffutils and through the
+Python streaming parser, and through the native gff3-to-bed12 parser when
+it has been built. A streaming parser may decline a file (and leave it to
+gffutils), but if it accepts one its output must match byte for byte.
+
+Run from scripts/gene-tracks:
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import convert_gffutils  # noqa: E402
+
+DATA_DIR = Path(__file__).parent / "data"
+
+# Fixtures the streaming parsers are expected to hand over to gffutils
+NEEDS_GFFUTILS = {"cds-only.gff3"}
+
+
+class StreamingParserTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        # extract_features_stream spills 'transcript' rows into TEMP_DIR
+        temp_dir = convert_gffutils.TEMP_DIR
+        convert_gffutils.TEMP_DIR = self.tmp
+        self.addCleanup(setattr, convert_gffutils, 'TEMP_DIR', temp_dir)
+
+    def convert(self, extract, gff3_path: Path):
+        """Run one of the extract_features_* functions on gff3_path."""
+        genes_path = self.tmp / "genes.bed12"
+        transcripts_path = self.tmp / "transcripts.bed12"
+        with open(genes_path, 'w') as gene_out, open(transcripts_path, 'w') as tx_out, \
+                contextlib.redirect_stdout(io.StringIO()):
+            counts = extract(gff3_path, gene_out, tx_out)
+        if counts is None:
+            return None
+        return counts, genes_path.read_text(), transcripts_path.read_text()
+
+    def gffutils_output(self, gff3_path: Path):
+        db_path = self.tmp / f"{gff3_path.name}.db"
+        return self.convert(
+            lambda path, gene_out, tx_out:
+                convert_gffutils.extract_features_db(path, db_path, gene_out, tx_out),
+            gff3_path,
+        )
+
+    def check_parser(self, extract):
+        fixtures = sorted(DATA_DIR.glob("*.gff3"))
+        self.assertTrue(fixtures, f"no fixtures in {DATA_DIR}")
+        for gff3_path in fixtures:
+            with self.subTest(fixture=gff3_path.name):
+                streamed = self.convert(extract, gff3_path)
+                if gff3_path.name in NEEDS_GFFUTILS:
+                    self.assertIsNone(streamed)
+                    continue
+                self.assertIsNotNone(streamed, "parser fell back to gffutils")
+                self.assertEqual(streamed, self.gffutils_output(gff3_path))
+
+    def test_python_stream_matches_gffutils(self):
+        self.check_parser(convert_gffutils.extract_features_stream)
+
+    @unittest.skipUnless(convert_gffutils.ACCELERATOR.exists(),
+                         "native parser not built (cargo build --release in gff3-to-bed12/)")
+    def test_native_stream_matches_gffutils(self):
+        self.check_parser(convert_gffutils.extract_features_native)
+
+    def test_gffutils_converts_fallback_fixtures(self):
+        for name in sorted(NEEDS_GFFUTILS):
+            with self.subTest(fixture=name):
+                counts, genes, _ = self.gffutils_output(DATA_DIR / name)
+                self.assertTrue(counts[0])
+                self.assertTrue(genes)
+
+
+if __name__ == '__main__':
+    unittest.main()